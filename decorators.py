@@ -50,6 +50,7 @@ MEMBER PROPERTY DESCRIPTORS
                 instances includes the following methods
                     add_callback(fnc, key=None)
                         promises to call fnc(source) as soon as the value of the property has changed, if key == None, key will be id(fnc)
+                        (or (id(fnc.__self__), id(fnc.__func__)) for bound methods, which are only weakly referenced)
                         returns fnc, so it can be used as a decorator
                     del_callback(key)
                         removed the callback fnc from the list
@@ -58,6 +59,8 @@ MEMBER PROPERTY DESCRIPTORS
                     raise_alert(reason = None)
                         internal implementation to call each of the callbacks
                         if source = none, will pass self to each callback
+                    has_live_observers()
+                        returns True if any callback is registered, cached properties do not raise alerts otherwise
                 the descriptor itself includes
                     add_callback(fnc, key=None)
                         promises to call fnc(source) bound to the actual instance as soon as the value of the property has changed
@@ -73,6 +76,12 @@ MEMBER PROPERTY DESCRIPTORS
                 creates a copy of the same property from the base class, so that new observers can be added without breaking the base class
                 use this for adding callbacks or cached object that depend on properties of the base class
                 inherited is a class method, so it can be used to adding callbacks without defining a specific property store for the subclass
+
+            batch()
+                context manager that delays the alerts raised in the block (in the current thread) until the outermost batch ends
+                then each property that alerted calls its callbacks once, with the reasons of all its alerts joined in a single tuple
+                cached properties that depend on the changed ones are invalidated at once, so they can be read inside the block
+                batch is a class method
             
             bindable(default_value = None, *, readonly = false)
                 special property that can be set to a reference to something else
@@ -82,6 +91,8 @@ MEMBER PROPERTY DESCRIPTORS
             cached(*dependencies, getter=None)
                 creates a property whose value is calculated using getter on access (lazy)
                 the result of the function is cached, and a callback is added that invalidates the cache as soon as any of the reactive objects in the dependencies raises an alert
+                the observers are alerted only when a value that was read is invalidated: a cached property that is never read never alerts,
+                and several changes of the dependencies between two reads raise a single alert
                 this can be used as a decorator as well
                     import ThisModule as cdh
                     class MyClass:
@@ -105,30 +116,54 @@ MEMBER PROPERTY DESCRIPTORS
         decorates a class declared inside another class
         returns a descriptor that creates an instance of the class on access, and assigns it to the instance, in a member with the same name as the class
         the class gives access to autocreate.parent_reference(), which gives access to the containing class
-        decorating a member function will result in a write-once-read-many member variable that is initialised on access with the provided function and cached thereafter
+        a class that declares a parent_reference gets a _parent_reference_table class attribute, listing its parent_reference members
+        decorating a member function will result in a member variable that is initialised on access with the provided function and cached thereafter
+        the created value is stored in the instance under the same name, so later accesses do not go through the descriptor at all
+        (this also means that assigning the member replaces the created value rather than raising an error)
 
 Example usage: see tests.py
 """
 
-import types, inspect, weakref
+import sys, keyword, types, weakref, functools, threading, contextlib, operator
 from collections import namedtuple
 
 #TODO: Add "thread specific" parameter to cached properties, returning a different instance for each thread  
 
+_weak_methods = weakref.WeakValueDictionary() #(id(self), id(func)) -> weakref.WeakMethod, shared by all the observers of the same bound method
+
+def _weak_method(fnc):
+    "returns the key and a weakref.WeakMethod for the bound method fnc, the same weakref is reused for all the properties observed by fnc"
+    key = (id(fnc.__self__), id(fnc.__func__))
+    ref = _weak_methods.get(key)
+    if ref is None or ref() != fnc:
+        ref = weakref.WeakMethod(fnc)
+        _weak_methods[key] = ref
+    return key, ref
+
+class _batch_state(threading.local):
+    pending = None #id(helper) -> (helper, [reasons]) while a property_store.batch() is active in this thread
+
+_batch = _batch_state()
+
 class NotSetException(Exception):
     def __init__(self, name = "(?)"):
         super().__init__(f"Property {name} accessed before setting, with no default value")
 
 class observable:
     class instance_helper:
+        #one helper is created per property per instance, so keep them small
+        __slots__ = ("_value", "init_done", "__weakref__")
+
         def __init__(self, descriptor):
             self._value = descriptor.default_value
-            self.init_done = False #keep for debug for now
+            if __debug__:
+                self.init_done = False
         
         def init_instance(self, descriptor, instance):
-            if self.init_done: #keep for debug for now
-                raise RuntimeError("Instance initialised twice")
-            self.init_done = True #keep for debug for now
+            if __debug__:
+                if self.init_done:
+                    raise RuntimeError("Instance initialised twice")
+                self.init_done = True
 
         @property
         def value(self):
@@ -153,7 +188,7 @@ class observable:
         self.readonly = readonly
     
     def __set_name__(self, owner, name):
-        if self.default_value == NotSetException:
+        if self.default_value is NotSetException:
             self.default_value = NotSetException(name)
         self.name = name
         self.store.slots[name] = self
@@ -163,14 +198,15 @@ class observable:
         return getattr(store, self.name)
 
     def __get__(self, instance, owner=None):
-        if instance == None:
+        if instance is None:
             return observable_reference(self)
-        return self.get_slot(instance).value
+        #same as get_slot, inlined as this runs at every read. the store shadows property_store.__get__ once created
+        return getattr(getattr(instance, self.store.name), self.name).value
 
     def __set__(self, instance, value):
         if self.readonly:
             raise AttributeError(f"Property {self.name} of class {type(instance).__name__} is readonly")
-        self.get_slot(instance).value = value
+        getattr(getattr(instance, self.store.name), self.name).value = value
     
     def __delete__(self, instance):
         if self.readonly:
@@ -190,7 +226,7 @@ class observable_reference(observable):
         pass
 
     def __get__(self, instance, owner=None):
-        if instance == None:
+        if instance is None:
             return self
         return self._ref(instance, owner)
     
@@ -214,10 +250,14 @@ class observable_reference(observable):
 
 class property_store:
     class attribute_reference(observable.instance_helper):
+        __slots__ = ("instance", "name", "_descriptor")
+
         def __init__(self, instance, name):
             #no need to call the base class
             self.instance = instance
             self.name = name
+            descriptor = getattr(type(instance),name, None)
+            self._descriptor = descriptor if isinstance(descriptor, observable) else None #looked up once, for check_circular_binding
 
         def init_instance(self, descriptor, instance):
             raise AttributeError("attribute_reference objects should not be included in property_store slots") #TODO: use a different exception type
@@ -234,9 +274,8 @@ class property_store:
             if tgt is self:
                 #TODO: use a different exception type
                 raise RuntimeError(f"Circular binding, found in {self.name} of {self.instance}")
-            descriptor = getattr(type(self.instance),self.name, None)
-            if isinstance(descriptor, observable):
-                descriptor.get_slot(self.instance).check_circular_binding(tgt)
+            if self._descriptor is not None:
+                self._descriptor.get_slot(self.instance).check_circular_binding(tgt)
 
         @property
         def reactive(self):
@@ -253,12 +292,19 @@ class property_store:
                 getattr(self, k).init_instance(v, instance)
 
         def __getattr__(self, name):
+            #only called the first time a name that is not a slot of this store is used, the result is then kept in vars(self)
+            if name[:2] == "__" and name[-2:] == "__":
+                #probed by copy, pickle and the like: not a property, and not to be kept in vars(self)
+                raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
             #try to check if we have real observable first (maybe from another store or a constant)
             descriptor = getattr(type(self._instance),name, None)
             if isinstance(descriptor, observable):
-                return descriptor.get_slot(self._instance)
-            #otherwise return a reference bound to instance.name
-            return property_store.attribute_reference(self._instance, name)
+                slot = descriptor.get_slot(self._instance)
+            else:
+                #otherwise return a reference bound to instance.name
+                slot = property_store.attribute_reference(self._instance, name)
+            vars(self)[name] = slot
+            return slot
 
         def __setattr__(self, name, value):
             if isinstance(getattr(self, name), bindable.instance_helper):
@@ -269,11 +315,14 @@ class property_store:
     def __init__(self):
         self.name = None
         self.slots = {}
+        #owner class -> slots merged along its mro. property stores added to the classes later are not seen, and the
+        #weak key does not free a class that is referenced by its own slots
+        self._resolved_slots = weakref.WeakKeyDictionary()
 
     def __get__(self, instance, owner=None):
-        if instance == None:
+        if instance is None:
             return self
-        if not self.name in vars(instance):
+        if self.name not in vars(instance):
             store = property_store.instance_helper()
             vars(instance)[self.name] = store
             slots = self.get_slots(owner)
@@ -282,16 +331,19 @@ class property_store:
         return vars(instance)[self.name]
     
     def get_slots(self, owner):
-        mro = inspect.getmro(owner)
-        slots = {}
-        for cl in reversed(mro):
-            store = vars(cl).get(self.name, None)
-            if isinstance(store, property_store):
-                slots.update(store.slots)
+        slots = self._resolved_slots.get(owner)
+        if slots is None:
+            mro = owner.__mro__
+            slots = {}
+            for cl in reversed(mro):
+                store = vars(cl).get(self.name, None)
+                if isinstance(store, property_store):
+                    slots.update(store.slots)
+            self._resolved_slots[owner] = slots
         return slots
 
     def __set_name__(self, owner, name):
-        if self.name != None:
+        if self.name is not None:
             raise AttributeError("The same property_store is assigned twice to a class")
         self.name = name
     
@@ -315,6 +367,23 @@ class property_store:
     @classmethod
     def inherited(self):
         return inherited_reference()
+
+    @classmethod
+    @contextlib.contextmanager
+    def batch(self):
+        "delays the alerts raised in the block, so that each property alerts only once when the outermost batch ends"
+        if _batch.pending is not None:
+            #nested, the outermost batch delivers the alerts
+            yield
+            return
+        _batch.pending = {}
+        try:
+            yield
+        finally:
+            pending = _batch.pending
+            _batch.pending = None
+            for helper, reasons in pending.values():
+                helper.deliver_alert(sum(reasons, ()), False)
     
     #TODO: maybe useful??
     # def bind(self,target, source):
@@ -327,14 +396,20 @@ class reactive(observable):
     alert_params = namedtuple("alert_params", ("old_value","new_value")) #this should have a better name
 
     class instance_helper(observable.instance_helper):
+        __slots__ = ("_strong", "_weak", "_keys", "_snapshot")
+
         def __init__(self, descriptor):
             super().__init__(descriptor)
-            self.observers = {}
+            self._strong = [] #callbacks called as they are
+            self._weak = [] #weakref.WeakMethod of the bound methods
+            self._keys = {} #key -> (is_weak, index in _weak or _strong), deleted entries are left as None in the lists
+            self._snapshot = None #callbacks used by the alerts, rebuilt after any change
         
         def init_instance(self, descriptor, instance):
             super().init_instance(descriptor, instance)
-            for v in descriptor.observers.values():
-                self.add_callback(types.MethodType(v, instance))
+            for key, v in descriptor.observers.items():
+                #the instance owns this helper, so its bound methods are kept as they are, with no weakref to resolve at each alert
+                self._insert(key, types.MethodType(v, instance), False)
 
         @property
         def value(self):
@@ -344,6 +419,10 @@ class reactive(observable):
         
         @value.setter
         def value(self, v):
+            if not self._keys:
+                #nobody to alert, skip building the reason
+                self._value = v
+                return
             old_value = self._value
             self._value = v
             self.raise_alert( (alert_reason(self,"set",reactive.alert_params(old_value, v)),) )
@@ -352,30 +431,103 @@ class reactive(observable):
             pass
 
         def add_callback(self, fnc, key=None):
-            if key == None:
-                key = id(fnc)
             if isinstance(fnc, types.MethodType):
-                fnc = weakref.WeakMethod(fnc)
-            self.observers[key] = fnc
+                method_key, ref = _weak_method(fnc)
+                if key is None:
+                    key = method_key
+                self._insert(key, ref, True)
+            else:
+                if key is None:
+                    key = id(fnc)
+                self._insert(key, fnc, False)
             return key
 
+        def _insert(self, key, fnc, is_weak):
+            if key in self._keys:
+                self.del_callback(key)
+            self._snapshot = None
+            if is_weak:
+                self._keys[key] = (True, len(self._weak))
+                self._weak.append(fnc)
+            else:
+                self._keys[key] = (False, len(self._strong))
+                self._strong.append(fnc)
+
         def del_callback(self, key):
-            del self.observers[key]
+            is_weak, index = self._keys.pop(key)
+            self._snapshot = None
+            if is_weak:
+                self._weak[index] = None
+            else:
+                self._strong[index] = None
+            if 2 * len(self._keys) < len(self._strong) + len(self._weak):
+                self._compact()
+
+        def _compact(self):
+            "rebuilds the callback lists without the deleted entries, new lists are created so that an alert in progress is not affected"
+            strong, weak, keys = [], [], {}
+            for key, (is_weak, index) in self._keys.items():
+                if is_weak:
+                    keys[key] = (True, len(weak))
+                    weak.append(self._weak[index])
+                else:
+                    keys[key] = (False, len(strong))
+                    strong.append(self._strong[index])
+            self._strong, self._weak, self._keys = strong, weak, keys
+
+        def _take_snapshot(self):
+            "returns the live callbacks, as (strong callbacks, propagating (key, weakref) pairs, other (key, weakref) pairs)"
+            strong = tuple(fnc for fnc in self._strong if fnc is not None)
+            first, rest = [], []
+            for key, (is_weak, index) in self._keys.items():
+                if is_weak:
+                    ref = self._weak[index]
+                    fnc = ref()
+                    if fnc is not None and isinstance(fnc.__self__, _propagating_helpers):
+                        first.append((key, ref))
+                    else:
+                        rest.append((key, ref))
+            return strong, tuple(first), tuple(rest)
 
         def raise_alert(self, reason):
-            for k, v in list(self.observers.items()):
-                if isinstance(v, weakref.WeakMethod):
-                    fnc = v()
-                    if fnc:
-                        fnc(reason)
-                    else:
-                        del self.observers[k] #TODO: not really tested yet!!
+            pending = _batch.pending
+            if pending is not None:
+                #dependent properties are updated right away, so that reads inside the batch are not stale, the other observers wait
+                self.deliver_alert(reason, True)
+                entry = pending.get(id(self))
+                if entry is None:
+                    pending[id(self)] = (self, [reason])
                 else:
+                    entry[1].append(reason)
+                return
+            self.deliver_alert(reason)
+
+        def deliver_alert(self, reason, propagating=None):
+            "calls the callbacks, or with propagating True/False only the ones that do/do not keep dependent properties up to date"
+            #the snapshot is reused until the callbacks change, and changes made by the callbacks do not affect this alert
+            snapshot = self._snapshot
+            if snapshot is None:
+                snapshot = self._snapshot = self._take_snapshot()
+            strong, first, rest = snapshot
+            dead = []
+            #the propagating callbacks go first, so that the other ones read up to date dependent properties
+            if propagating is not False:
+                _call_weak(first, reason, dead)
+            if not propagating:
+                for fnc in strong:
                     fnc(reason)
+                _call_weak(rest, reason, dead)
+            for key, ref in dead:
+                entry = self._keys.get(key)
+                if entry is not None and entry[0] and self._weak[entry[1]] is ref: #not replaced in the meantime
+                    self.del_callback(key)
         
         def alert(self, reason):
             self.raise_alert(reason)
 
+        def has_live_observers(self):
+            return len(self._keys) > 0
+
         @property
         def reactive(self):
             return True
@@ -385,12 +537,12 @@ class reactive(observable):
         self.observers = {}
 
     def __get__(self, instance, owner=None):
-        if instance == None:
+        if instance is None:
             return reactive_reference(self)
-        return self.get_slot(instance).value
+        return getattr(getattr(instance, self.store.name), self.name).value
 
     def add_callback(self, fnc, key=None):
-        if key == None:
+        if key is None:
             key = id(fnc)
         self.observers[key] = fnc
         return fnc
@@ -415,7 +567,7 @@ class reactive_reference(reactive):
         return self._ref.get_slot(instance)
 
     def __get__(self, instance, owner=None):
-        if instance == None:
+        if instance is None:
             return self
         return self._ref(instance, owner)
 
@@ -455,7 +607,7 @@ class inherited_reference(reactive):
         return self._ref.get_slot(instance)
 
     def __get__(self, instance, owner=None):
-        if instance == None:
+        if instance is None:
             return self
         return self._ref(instance, owner)
 
@@ -480,7 +632,7 @@ class constant(reactive, reactive.instance_helper):
         return self
 
     def __get__(self, instance, owner=None):
-        if instance == None:
+        if instance is None:
             return self
         return self._value
 
@@ -516,6 +668,9 @@ class constant(reactive, reactive.instance_helper):
     def alert(self, reason):
         pass #ignore alerts
 
+    def has_live_observers(self):
+        return False
+
     def copy(self):
         return self
 
@@ -524,12 +679,12 @@ class default():
         self._value = value
 
     def __set_name__(self, owner, name):
-        if self._value == NotSetException:
+        if self._value is NotSetException:
             self._value = NotSetException(name)
         self.name = name
 
     def __get__(self, instance, owner=None):
-        if instance == None:
+        if instance is None:
             return self
         ret = vars(instance).get(self.name, self._value)
         if isinstance(ret, NotSetException):
@@ -546,9 +701,12 @@ class bindable(reactive):
     alert_params = namedtuple("alert_params", ("bound","target"))
 
     class instance_helper(reactive.instance_helper):
+        __slots__ = ("bound", "default_value", "_id")
+
         def __init__(self, descriptor):
             super().__init__(descriptor)
             self.bound = False
+            self._id = id(self) #key of bound_alert in the observers of the bound object
             self.default_value = descriptor.default_value #TODO: check this should be superfluous
 
         @property
@@ -564,6 +722,8 @@ class bindable(reactive):
         def value(self, v):
             if self.bound:
                 self._value.value = v #do not alert twice, let the bond do the alert
+            elif not self._keys:
+                self._value = v
             else:
                 old_value = self._value
                 self._value = v
@@ -588,28 +748,34 @@ class bindable(reactive):
             old_bound = self.bound
             old_value = self._value
 
-            if value == None:
-                if self.bound == True and self._value.reactive:
-                    self._value.del_callback(id(self)) #check it is reactive first
+            if isinstance(value, observable.instance_helper):
+                value.check_circular_binding(self) #before changing anything
+            self._unbind()
+            self._bind(value)
+            self.raise_alert( (alert_reason(self,"bind",reactive.alert_params(bindable.alert_params(old_bound,old_value),bindable.alert_params(self.bound, self._value))),) )
+
+        def _unbind(self):
+            if self.bound and self._value.reactive:
+                self._value.del_callback(self._id)
+
+        def _bind(self, value):
+            if value is None:
                 self.bound = False
                 self._value = self.default_value
             elif isinstance(value, observable.instance_helper):
-                value.check_circular_binding(self)
-                if self.bound == True and self._value.reactive:
-                    self._value.del_callback(id(self))
                 self.bound = True
                 self._value = value
-                if self._value.reactive:
-                    self._value.add_callback(self.bound_alert, id(self))
+                if value.reactive:
+                    value.add_callback(self.bound_alert, self._id)
             else:
-                if self.bound == True and self._value.reactive:
-                    self._value.del_callback(id(self))
                 self.bound = False
                 self._value = value
-            self.raise_alert( (alert_reason(self,"bind",reactive.alert_params(bindable.alert_params(old_bound,old_value),bindable.alert_params(self.bound, self._value))),) )
 
         def bound_alert(self, reason):
-            self.raise_alert( (alert_reason(self,reason[0].event,reason[0].args),) + reason )
+            if not self._keys:
+                return #nobody to forward the alert to
+            source = reason[0]
+            self.raise_alert( (alert_reason(self,source.event,source.args),) + reason )
         
         @property
         def reactive(self):
@@ -619,11 +785,17 @@ class bindable(reactive):
 
 class cached(reactive):
     alert_params = namedtuple("alert_params", ("old_value",) )
+    no_old_value = alert_params(None) #after the first invalidation, the old value is always None
+
     class instance_helper(reactive.instance_helper):
+        __slots__ = ("valid", "dependencies", "rebindable_ids", "getter", "cache", "invalidated_reason")
+
         def __init__(self, descriptor):
             super().__init__(descriptor)
             self.valid = False
             self.dependencies = []
+            self.rebindable_ids = set() #ids of the dependencies that can stop being reactive, i.e. the bindable ones
+            self.invalidated_reason = None #head of the alerts with no old value, built by the first one and reused
         
         def init_instance(self, descriptor, instance):
             super().init_instance(descriptor, instance)
@@ -635,16 +807,34 @@ class cached(reactive):
                     raise RuntimeError(f"Cached object dependencies must be reactive: found in {descriptor.name} of class {type(instance).__name__}")
                 slot.add_callback(self.invalidate)
                 self.dependencies.append(slot)
+                if isinstance(slot, bindable.instance_helper):
+                    self.rebindable_ids.add(id(slot))
 
-        def invalidate(self, reason):
+        def _mark_dirty(self):
+            "invalidates the cache and returns the value stored before"
             self.valid = False
             old_value = self._value
             self._value = None
-            # for dep in self.dependencies: #this could be more clever and only check the object that raised the alert
-            #     if not dep.reactive:
-            if reason[0].originator in self.dependencies and not reason[0].originator.reactive:
+            return old_value
+
+        def invalidate(self, reason):
+            #only a rebound dependency can stop being reactive, so check just the one that raised the alert, if it is bindable
+            originator = reason[0].originator
+            if id(originator) in self.rebindable_ids and not originator.reactive:
+                self._mark_dirty()
                 raise RuntimeError("Cached object dependencies must stay reactive all the time")
-            self.raise_alert( (alert_reason(self, "invalidate", cached.alert_params(old_value)), ) + reason)
+            if not self.valid:
+                return #not read since the last invalidation, so the observers have nothing new to know
+            old_value = self._mark_dirty()
+            #the new value is pulled on the next read, the alert is pushed only if someone is listening
+            if self.has_live_observers():
+                if old_value is None:
+                    head = self.invalidated_reason
+                    if head is None:
+                        head = self.invalidated_reason = (alert_reason(self, "invalidate", cached.no_old_value), )
+                    self.raise_alert(head + reason)
+                else:
+                    self.raise_alert( (alert_reason(self, "invalidate", cached.alert_params(old_value)), ) + reason)
 
         @property
         def value(self):
@@ -675,70 +865,97 @@ class cached(reactive):
         tmp.observers = dict(self.observers)
         return tmp
 
+#helpers whose bound methods forward alerts or invalidate caches, called at once even inside a property_store.batch().
+#the type of __self__ is checked, so that subclasses overriding bound_alert or invalidate are still propagating
+_propagating_helpers = (bindable.instance_helper, cached.instance_helper)
+
+def _call_weak(weak, reason, dead):
+    "calls the bound methods of the (key, weakref) pairs in weak, the pairs whose method is gone are appended to dead"
+    for key, ref in weak:
+        fnc = ref()
+        if fnc is None:
+            dead.append((key, ref))
+        else:
+            fnc(reason)
+
+def _mix_args(args, inner_args):
+    "replaces the first args with the positional arguments received in the call"
+    return tuple(inner_args[:len(args)]) + tuple(args[len(inner_args):])
+
+def _mix_kwargs(kwargs, inner_kwargs):
+    "replaces the kwargs with the ones received in the call, limitedly to the keys already in kwargs"
+    if not inner_kwargs:
+        return kwargs
+    return {**kwargs, **{k: inner_kwargs[k] for k in kwargs.keys() & inner_kwargs.keys()}}
+
+def _forwarded_args(args, kwargs, mixargs):
+    "returns the source code of the arguments to forward, so that args/kwargs/mixargs are resolved once at decoration time"
+    forwarded = []
+    if args is None:
+        forwarded.append("*inner_args")
+    elif args and mixargs:
+        forwarded.append("*_mix_args(args, inner_args)")
+    elif args:
+        forwarded.append("*args")
+    if kwargs is None:
+        forwarded.append("**inner_kwargs")
+    elif kwargs and mixargs:
+        forwarded.append("**_mix_kwargs(kwargs, inner_kwargs)")
+    elif kwargs:
+        forwarded.append("**kwargs")
+    return ", ".join(forwarded)
+
+def _specialize(source, name, **namespace):
+    "compiles the source of a wrapper and returns the function called name, with namespace as its globals"
+    namespace.update(_mix_args=_mix_args, _mix_kwargs=_mix_kwargs)
+    exec(source, namespace)
+    return namespace[name]
+
 def call(function_to_call, *, args=(), kwargs={}, append=False, mixargs=False):
     "decorator that prepends or appends a member function call to the decorated member function, putting args or kwargs to None passes the ones given in the call. always returns the value of the decorated function"
+    if args is not None:
+        args = tuple(args)
+    if kwargs is not None:
+        kwargs = dict(kwargs)
+    forwarded = _forwarded_args(args, kwargs, mixargs)
+    if append:
+        source = ("def decorated_function(self, *inner_args, **inner_kwargs):\n"
+                  "    retval = function(self, *inner_args, **inner_kwargs)\n"
+                  f"    function_to_call(self, {forwarded})\n"
+                  "    return retval\n")
+    else:
+        source = ("def decorated_function(self, *inner_args, **inner_kwargs):\n"
+                  f"    function_to_call(self, {forwarded})\n"
+                  "    return function(self, *inner_args, **inner_kwargs)\n")
+
     def decorate(function):
-        def decorated_function(self, *inner_args, **inner_kwargs):
-            nonlocal args, kwargs, append, mixargs
-            if args == None:
-                targs = inner_args
-            else:
-                targs = list(args)
-                if mixargs: #this could be done in a thousand ways
-                    for i in range(min(len(args),len(inner_args))):
-                        targs[i] = inner_args[i]
-                
-            if kwargs == None:
-                kwargs = inner_kwargs
-            else:
-                tkwargs = dict(kwargs)
-                if mixargs: #this could be done in a thousand ways
-                    for k in kwargs.keys():
-                        if k in inner_kwargs:
-                            tkwargs[k] = inner_kwargs[k]
-
-            if not append:
-                function_to_call(self, *targs, **tkwargs)
-            retval = function(self, *inner_args, **inner_kwargs)
-            if append:
-                function_to_call(self, *targs, **tkwargs)
-            return retval
-        return decorated_function
+        decorated_function = _specialize(source, "decorated_function", function=function,
+                                         function_to_call=function_to_call, args=args, kwargs=kwargs)
+        return functools.wraps(function)(decorated_function)
     return decorate
 
 def baseinit(class_to_decorate=None, *, args=(), kwargs={}, mixargs=False):
-    if class_to_decorate == None:
+    if class_to_decorate is None:
         #return a decorator
         def decorate(inner_class_to_decorate):
-            return baseinit(inner_class_to_decorate, args=args, kwargs=kwargs)
+            return baseinit(inner_class_to_decorate, args=args, kwargs=kwargs, mixargs=mixargs)
         return decorate
     else:
         #decorate directly
         if isinstance(class_to_decorate, type):
             old_init = class_to_decorate.__init__
             base_init = super(class_to_decorate,class_to_decorate).__init__
-            def new_init(self, *inner_args, **inner_kwargs):
-                nonlocal args, kwargs, mixargs, old_init, base_init
-                if args == None:
-                    targs = inner_args
-                else:
-                    targs = list(args)
-                    if mixargs: #this could be done in a thousand ways
-                        for i in range(min(len(args),len(inner_args))):
-                            targs[i] = inner_args[i]
-                    
-                if kwargs == None:
-                    kwargs = inner_kwargs
-                else:
-                    tkwargs = dict(kwargs)
-                    if mixargs: #this could be done in a thousand ways
-                        for k in kwargs.keys():
-                            if k in inner_kwargs:
-                                tkwargs[k] = inner_kwargs[k]
-
-                base_init(self, *targs, **tkwargs)
-                if old_init != base_init:
-                    old_init(self, *inner_args, **inner_kwargs)
+            if args is not None:
+                args = tuple(args)
+            if kwargs is not None:
+                kwargs = dict(kwargs)
+            source = ("def new_init(self, *inner_args, **inner_kwargs):\n"
+                      f"    base_init(self, {_forwarded_args(args, kwargs, mixargs)})\n")
+            if old_init != base_init:
+                source += "    old_init(self, *inner_args, **inner_kwargs)\n"
+            new_init = _specialize(source, "new_init", old_init=old_init, base_init=base_init, args=args, kwargs=kwargs)
+            if old_init != base_init:
+                functools.update_wrapper(new_init, old_init)
             class_to_decorate.__init__ = new_init
         else:
             raise TypeError
@@ -756,16 +973,22 @@ def assign(**kwargs):
     return decorate
 
 def assignargs(**kwargs):
+    keys = tuple(kwargs.keys())
+    defaults = tuple(kwargs.items())
     def decorate(fnc):
         def decorated_function(self, *inner_args, **inner_kwargs):
-            tmp = dict(kwargs)
-            tmp.update(inner_kwargs)
-            for i,k in zip(range(len(inner_args)),list(tmp.keys())[:len(inner_args)]):
-                setattr(self,k,inner_args[i])
-                del tmp[k]
-            for k in kwargs.keys():
-                if k in tmp:
-        	        setattr(self,k,tmp[k])
+            n = len(inner_args)
+            #the first keys are given by position
+            for k, v in zip(keys, inner_args):
+                setattr(self,k,v)
+            #the remaining ones take the default, unless passed by keyword
+            tmp = dict(defaults[n:])
+            if inner_kwargs:
+                for k in keys[:n]:
+                    inner_kwargs.pop(k, None)
+                tmp.update(inner_kwargs)
+            for k in keys[n:]:
+                setattr(self,k,tmp[k])
             return fnc(self, *inner_args, **tmp)
         return decorated_function
     return decorate
@@ -786,7 +1009,7 @@ class indexable:
         self.func = fnc
 
     def __get__(self, instance, owner=None):
-        if instance == None:
+        if instance is None:
             return self
         return indexable_method(self.func, instance)
 
@@ -796,40 +1019,75 @@ class monkey_method:
 
     def __set_name__(self, owner, name):
         self.name = name
+        self.bound_name = f"__mm_{name}" #where the bound method is kept in the instance
 
     def __get__(self, instance, owner=None):
-        if instance == None:
+        if instance is None:
             return self
-        fnc = vars(instance).get(self.name, self.func)
-        return types.MethodType(fnc, instance)
+        members = vars(instance)
+        fnc = members.get(self.name, self.func)
+        bound = members.get(self.bound_name)
+        if bound is None or bound.__func__ is not fnc or bound.__self__ is not instance: #copies of the instance carry the entry too
+            bound = types.MethodType(fnc, instance)
+            members[self.bound_name] = bound
+        return bound
     
     def __set__(self, instance, value):
         vars(instance)[self.name] = value
+        vars(instance).pop(self.bound_name, None)
     
     def __delete__(self, instance):
         del vars(instance)[self.name]
+        vars(instance).pop(self.bound_name, None)
+
+_MISSING = object() #sentinel for dict lookups where None is a valid value
+
+#class -> {name: member}. the memo is not updated if the class is changed later with setattr, and a member that refers
+#back to its class (e.g. a parent_reference, that keeps its ownerclass) keeps the class alive despite the weak key
+_class_members = weakref.WeakKeyDictionary()
+
+def _class_member(cls, name):
+    "getattr(cls, name), memoized per class: the classes are not expected to change once they are built"
+    members = _class_members.get(cls)
+    if members is None:
+        members = _class_members[cls] = {}
+    member = members.get(name, _MISSING)
+    if member is _MISSING:
+        member = members[name] = getattr(cls, name)
+    return member
 
 class delayed_callback:
+    __slots__ = ("prop_path", "_instance_path", "_to_instance", "fnc", "__weakref__") #bound to instances and registered through WeakMethod
+
     def __init__(self, fnc, prop_path=(), instance_path=()):
-        self.prop_path = prop_path
+        self.prop_path = tuple(map(sys.intern, prop_path)) #attribute names, interned so that path comparisons are pointer checks
         self.instance_path = instance_path
         self.fnc = fnc
 
+    @property
+    def instance_path(self):
+        return self._instance_path
+
+    @instance_path.setter
+    def instance_path(self, path):
+        #the walk to the instance that receives the callback is done at every alert, so compile it when the path changes
+        path = tuple(map(sys.intern, path))
+        self._instance_path = path
+        self._to_instance = operator.attrgetter(".".join(path)) if path else None
+
     def __call__(self, instance, source):
-        for key in self.instance_path:
-            instance = getattr(instance,key)
+        if self._to_instance is not None:
+            instance = self._to_instance(instance)
         self.fnc(instance, source)
 
     def attach(self, prop):
         "adds callbacks on descriptors"
-        new_path = ()
-        for key in self.prop_path:
+        for i, key in enumerate(self.prop_path):
             prop = getattr(prop,key)
-            new_path = (key,) + new_path
             if isinstance(prop, parent_reference):
                 # assert prop._parent_class == None
-                #not created yet, delay again
-                prop._delayed_callbacks.append(delayed_callback(self.fnc,self.prop_path[len(new_path):],self.instance_path))
+                #not created yet, delay again with the rest of the path
+                prop._delayed_callbacks.append(delayed_callback(self.fnc,self.prop_path[i+1:],self.instance_path))
                 return
             elif isinstance(prop, autocreate):
                 self.instance_path = (prop.parent_reference_member_name, ) + self.instance_path
@@ -839,51 +1097,107 @@ class delayed_callback:
                     prop = prop.factory
         prop.add_callback(self)
     
-    def add_callback(self, parent):
-        "adds callbacks on instances"
-        prop = parent
-        for key in self.prop_path[:-1]:
-            prop = getattr(prop, key)
-        descriptor = getattr(type(prop), self.prop_path[-1])
-        slot = descriptor.get_slot(prop)
+    def add_callback(self, parent, prop):
+        "adds callbacks on instances, prop is the object in parent that owns the last property of the path"
+        slot = _class_member(type(prop), self.prop_path[-1]).get_slot(prop)
+        #the bound method is only used to build the WeakMethod (pooled in _weak_methods), do not keep it: it would hold parent alive
         slot.add_callback(types.MethodType(self, parent))
 
+def _attr_expr(target, name):
+    "source for reading name from target, falling back to getattr when name is not a plain identifier"
+    if name.isidentifier() and not keyword.iskeyword(name):
+        return f"{target}.{name}"
+    return f"getattr({target}, {name!r})"
+
+def _attr_assign(target, name):
+    "source for assigning value to name in target, falling back to setattr when name is not a plain identifier"
+    if name.isidentifier() and not keyword.iskeyword(name):
+        return f"{target}.{name} = value"
+    return f"setattr({target}, {name!r}, value)"
+
 class attribute_reference:
+    __slots__ = ("__name_in_parent", "_root", "_path", "_owner", "_get", "_set", "__weakref__")
+    _cache = weakref.WeakValueDictionary() #(id(root), path) -> attribute_reference, so that each chain is built once
+
+    @classmethod
+    def _lookup(cls, parent, name):
+        "returns the reference to name in parent, reusing the one already built if it is still alive"
+        if name[:2] == "__" and name[-2:] == "__":
+            #not a reference: the slotted parents have no __dict__, and vars() or copy must not get a reference instead
+            raise AttributeError(f"'{type(parent).__name__}' object has no attribute '{name}'")
+        name = sys.intern(name)
+        if isinstance(parent, attribute_reference):
+            key = (id(parent._root), parent._path + (name, ))
+        else:
+            key = (id(parent), (name, ))
+        ref = cls._cache.get(key)
+        if ref is None:
+            ref = cls(parent, name)
+            cls._cache[key] = ref
+        return ref
+
     def __init__(self, parent, name):
-        self.__parent = parent
+        name = sys.intern(name)
         self.__name_in_parent = name
+        #flatten the chain once: the root parent_reference or autocreate, and the names to follow from it
+        if isinstance(parent, attribute_reference):
+            self._root = parent._root
+            self._path = parent._path + (name, )
+        else:
+            self._root = parent
+            self._path = (name, )
+        self._owner = self._get = self._set = None #compiled by _compile on first use
+
+    def _compile(self):
+        "compiles the accessors that follow the path from an instance, once the root knows its name in the class"
+        root = self._root
+        target = _attr_expr("instance", root._name if isinstance(root, parent_reference) else root.name)
+        for key in self._path[:-1]:
+            target = _attr_expr(target, key)
+        name = self.__name_in_parent
+        source = (f"def _owner(instance):\n    return {target}\n"
+                  f"def _get(instance):\n    return {_attr_expr(target, name)}\n"
+                  f"def _set(instance, value):\n    {_attr_assign(target, name)}\n")
+        namespace = {}
+        exec(source, namespace)
+        self._owner = namespace["_owner"]
+        self._get = namespace["_get"]
+        self._set = namespace["_set"]
     
     def __set_name__(self, owner, name):
         pass
 
     @property
     def ownerclass(self):
-        return self.__parent.ownerclass
+        return self._root.ownerclass
 
     def get_slot(self, instance):
-        parent = self.__parent.__get__(instance, self.__parent.ownerclass)
+        if self._owner is None:
+            self._compile()
+        parent = self._owner(instance)
         descriptor = getattr(type(parent), self.__name_in_parent)
         return descriptor.get_slot(parent)     
 
     def __get__(self, instance, owner=None):
-        if instance == None:
+        if instance is None:
             return self
-        return getattr(self.__parent.__get__(instance, self.ownerclass), self.__name_in_parent)
+        if self._get is None:
+            self._compile()
+        return self._get(instance)
 
     def __set__(self, instance, value):
-        setattr(self.__parent.__get__(instance, self.ownerclass), self.__name_in_parent, value) #TODO: Test me!
+        if self._set is None:
+            self._compile()
+        self._set(instance, value)
 
     def __getattr__(self, name):
-        return attribute_reference(self, name)
+        return attribute_reference._lookup(self, name)
     
     def __call__(self, *args, **kwargs):
         if self.__name_in_parent == "add_callback" and len(args) == 1 and callable(args[0]) and kwargs == {}:
-            #used as a decorator for adding a callback
-            prop_path = ()
-            ptr = self.__parent
-            while isinstance(ptr,attribute_reference):
-                prop_path = (ptr.__name_in_parent, ) + prop_path
-                ptr = ptr.__parent
+            #used as a decorator for adding a callback, the path from the root is already known
+            prop_path = self._path[:-1]
+            ptr = self._root
             if isinstance(ptr, parent_reference) or isinstance(ptr, autocreate):
                 ptr._delayed_callbacks.append(delayed_callback(args[0], prop_path))
             else:
@@ -893,93 +1207,148 @@ class attribute_reference:
         else:
             raise TypeError("'attribute_reference' object is not callable - unless it's a add_callback decorator ;-)")
 
+def _iter_class_attrs(cls):
+    "yields (name, value) for the members of cls and its bases, like dir() but unsorted and without a second getattr"
+    seen = set()
+    for base in cls.__mro__:
+        for k, v in vars(base).items():
+            if k in seen:
+                continue
+            seen.add(k)
+            yield k, v
+
+#the classes that declare a parent_reference keep their table in their own __dict__, set by parent_reference.__set_name__:
+#the table refers back to the class through the descriptors, a cycle that is collected with the class
+_parent_refs_member = "_parent_reference_table"
+#class -> ((name, parent_reference), ...) for all the other classes, built on the first lookup. their descriptors belong to
+#other classes (e.g. the bases), so the weak key is not kept alive by its value. parent_references added with setattr
+#after the lookup are not seen
+_parent_refs = weakref.WeakKeyDictionary()
+
+def _find_parent_refs(cls):
+    "scans cls and its bases for parent_reference members"
+    return tuple((k, v) for k, v in _iter_class_attrs(cls) if isinstance(v, parent_reference))
+
+def _get_parent_refs(cls):
+    "returns the parent_reference members of cls, including the inherited ones, computed once per class"
+    refs = vars(cls).get(_parent_refs_member) #own __dict__ only, subclasses get their own tuple
+    if refs is None:
+        refs = _parent_refs.get(cls)
+        if refs is None:
+            refs = _parent_refs[cls] = _find_parent_refs(cls)
+    return refs
+
 class parent_reference_host: #this thing is mind blowing.....
+    __slots__ = ("__name", "__decorated")
+
     def __init__(self, decorated = None):
         self.__name = None
         self.__decorated = decorated
     
     def __get__(self, instance, owner=None):
-        if self.__decorated == None:
-            if instance == None:
+        if self.__decorated is None:
+            if instance is None:
                 return self
-            if self.__name in vars(instance):
-                return vars(instance)[self.__name]
-            else:
-                return None
+            return vars(instance).get(self.__name)
         else:
             # raise NotImplementedError #TODO: a wrapped object will not be connected the first time it is used
             return self.__decorated.__get__(instance,owner)
     
     def __set_name__(self, owner, name):
         self.__name = name
-        if self.__decorated != None:
+        if self.__decorated is not None:
             self.__decorated.__set_name__(owner,name)
 
     def __set__(self, instance, value):
-        if self.__name in vars(instance):
-            old_value = vars(instance)[self.__name]
-            for k in dir(type(old_value)):
-                v =  getattr(type(old_value), k)
-                if isinstance(v, parent_reference):
-                    v.disconnect(old_value, instance, self.__name)
-        if self.__decorated == None:
-            vars(instance)[self.__name] = value
+        members = vars(instance)
+        old_value = members.get(self.__name, _MISSING)
+        if self.__decorated is None and type(old_value) is type(value):
+            #the store is a plain dict write that runs no code, so with the same class (the common re-parent case)
+            #each reference can be moved from the old value to the new one in a single pass after it
+            members[self.__name] = value
+            for k, v in _get_parent_refs(type(value)):
+                v.disconnect(old_value, instance, self.__name)
+                v.connect(value, instance, self.__name)
+            return
+        #disconnect before the store, so that anything run by the store does not see the old value still linked
+        if old_value is not _MISSING:
+            for k, v in _get_parent_refs(type(old_value)):
+                v.disconnect(old_value, instance, self.__name)
+        if self.__decorated is None or not hasattr(type(self.__decorated), "__set__"):
+            #non-data descriptors (e.g. autocreate) are shadowed by the instance member
+            members[self.__name] = value
         else:
             self.__decorated.__set__(instance,value)
-        if value != None:
-            for k in dir(type(value)):
-                v =  getattr(type(value), k)
-                if isinstance(v, parent_reference):
-                    v.connect(value, instance, self.__name)
+        if value is not None:
+            for k, v in _get_parent_refs(type(value)):
+                v.connect(value, instance, self.__name)
 
     def __delete__(self,instance):
-        if self.__decorated == None:
+        if self.__decorated is None or not hasattr(type(self.__decorated), "__delete__"):
             del vars(instance)[self.__name]
         else:
             self.__decorated.__delete__(instance)
 
 class parent_reference:
+    __slots__ = ("_name", "__ownerclass", "_delayed_callbacks")
+
     def __init__(self):
-        self.__name = None
+        self._name = None
         self.__ownerclass = None
         # self._parent_class = None
         self._delayed_callbacks = []
     
     def __set_name__(self, owner, name):
-        if self.__name != None and not owner is self.__ownerclass:
+        if self._name is not None and owner is not self.__ownerclass:
             raise AttributeError("The same parent_reference is assigned to two different classes")
-        self.__name = name
+        self._name = name
         self.__ownerclass = owner
+        #all members are in place already, so the table is ready before the first assignment
+        if _parent_refs_member not in vars(owner):
+            type.__setattr__(owner, _parent_refs_member, _find_parent_refs(owner))
+
+    @property
+    def ownerclass(self):
+        return self.__ownerclass
 
     def __get__(self, instance, owner=None):
-        if instance == None:
+        if instance is None:
             return self
-        return vars(instance)[self.__name] #go direct to __dict__
-    
+        #connect and autocreate write the host in the instance __dict__, which shadows this: only reached when not connected
+        raise AttributeError(f"Parent_reference {self._name} is not connected")
+
     def __getattr__(self, name):
-        return attribute_reference(self, name)
+        return attribute_reference._lookup(self, name)
     
     def connect(self, instance, host, name):
-        assert self.__name in vars(instance), "Parent_reference is already connected"
+        if __debug__:
+            if self._name in vars(instance):
+                raise AttributeError("Parent_reference is already connected")
 
-        vars(instance)[self.__name] = host
+        vars(instance)[self._name] = host
         for cb in self._delayed_callbacks:
             raise NotImplementedError #add the triggers
 
     def disconnect(self, instance, host, name):
-        assert not self.__name in vars(instance), "Parent_reference is already disconnected"
-        
+        if __debug__:
+            if self._name not in vars(instance):
+                raise AttributeError("Parent_reference is already disconnected")
+
         for cb in self._delayed_callbacks:
             raise NotImplementedError #remove the triggers
-        del vars(instance)[self.__name]
+        del vars(instance)[self._name]
 
 class autocreate:
+    __slots__ = ("name", "ownerclass", "_delayed_callbacks", "factory", "wrapped", "parent_reference_member_name", "_parent_ref_names", "_install_plan")
     parent_reference = parent_reference
 
     def __init__(self, factory):
         self.name = None
         self.ownerclass = None
         self._delayed_callbacks = []
+        self.parent_reference_member_name = None
+        self._parent_ref_names = () #parent_reference members of the wrapped class, found by __set_name__
+        self._install_plan = () #(delayed_callback, getter of the object that owns the property), see _get_install_plan
         if type(factory) is type:
             class wrapper(factory):
                 def __init__(child):
@@ -995,53 +1364,57 @@ class autocreate:
             self.wrapped = None
 
     def __get__(self, instance, owner=None):
-        if instance == None:
+        if instance is None:
             return self
-        if not self.name in vars(instance):
-            vars(instance)[self.name] = None #canary to identify circular references
-            if self.wrapped:
-                product = self.factory()
-                vars(instance)[self.name] = product
-
-                #assign instance to all parent references directly, so that triggers stored in it will not be created twice
-                for k in dir(self.wrapped):
-                    v = getattr(self.wrapped, k)
-                    if isinstance(v, parent_reference):
-                        vars(product)[k] = instance
-                
-                #call the original __init__ -- not sure this should be done here or after the callbacks
-                self.wrapped.__init__(product)
-                
-                #add the callbacks that have been queued in the autocreate descriptor
-                for trg in self._delayed_callbacks:
-                    trg.prop_path = (self.name, ) + trg.prop_path
-                    trg.add_callback(instance)
-            else:
-                product = self.factory(instance)
-                vars(instance)[self.name] = product                
+        members = vars(instance)
+        product = members.get(self.name, _MISSING)
+        if product is not _MISSING:
+            return product
+        members[self.name] = None #canary to identify circular references
+        if self.wrapped:
+            product = self.factory()
+            members[self.name] = product
 
-        return vars(instance)[self.name]
+            #assign instance to all parent references directly, so that triggers stored in it will not be created twice
+            for k in self._parent_ref_names:
+                vars(product)[k] = instance
+
+            #call the original __init__ -- not sure this should be done here or after the callbacks
+            self.wrapped.__init__(product)
+
+            #add the callbacks that have been queued in the autocreate descriptor
+            for trg, owner_of in self._get_install_plan():
+                trg.add_callback(instance, owner_of(instance))
+        else:
+            product = self.factory(instance)
+            members[self.name] = product
+        return product
+
+    def _get_install_plan(self):
+        "compiles the paths of the queued callbacks once, rebuilt only if more callbacks were queued since"
+        plan = self._install_plan
+        if len(plan) != len(self._delayed_callbacks):
+            plan = self._install_plan = tuple(
+                (trg, operator.attrgetter(".".join((self.name, ) + trg.prop_path[:-1])))
+                for trg in self._delayed_callbacks)
+        return plan
 
-    def __set__(self, instance, value):
-        raise AttributeError("Autocreated class members are read-only")
-    
     def __set_name__(self, owner, name):
-        if self.name != None:
+        if self.name is not None:
             raise AttributeError("The same autocreate is assigned twice to a class")
         self.name = name
         self.ownerclass = owner
-        self.parent_reference_member_name = None
         #add the callbacks that have been queued in the parent_references of the inner object
         if self.wrapped:
-            factory = self.wrapped
-            for k in dir(factory):
-                v = getattr(factory, k)
-                if isinstance(v, parent_reference):
-                    self.parent_reference_member_name = k
-                    # v._parent_class = self #not needed
-                    for trg in v._delayed_callbacks:
-                        trg.instance_path = (name, ) + trg.instance_path
-                        trg.attach(owner)
+            refs = _get_parent_refs(self.wrapped)
+            if not refs:
+                return
+            for k, v in refs:
+                self.parent_reference_member_name = k
+                for trg in v._delayed_callbacks:
+                    trg.instance_path = (name, ) + trg.instance_path
+                    trg.attach(owner)
+            self._parent_ref_names = tuple(k for k, v in refs)
 
     def __getattr__(self, name): #TODO: fix member names so that they do not obscure too much the user defined __getattr__
-        return attribute_reference(self, name)
\ No newline at end of file
+        return attribute_reference._lookup(self, name)
\ No newline at end of file
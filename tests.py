@@ -1,4 +1,7 @@
-from decorators import baseinit, call, assign, assignargs, property_store, autocreate
+import copy
+from decorators import baseinit, call, assign, assignargs, monkey_method, property_store, autocreate, parent_reference_host
+
+fired = [] #(callback name, instance) of the delayed callbacks, to check which instance gets them
 
 class base1:
     def __init__(self, param):
@@ -25,6 +28,7 @@ class outer(base1):
 
         @parent.op1.add_callback
         def inner_on_op1(self, source):
+            fired.append(("inner_on_op1", self))
             print( ("inner_on_op1", self,source) )
         
         @autocreate
@@ -35,6 +39,7 @@ class outer(base1):
         
             @parent.parent.op1.add_callback
             def inner_inner_on_op1(self, source):
+                fired.append(("inner_inner_on_op1", self))
                 print( ("inner_inner_on_op1",self,source) )
             
             @props.cached(iip1, parent.ip1, parent.parent.op1)
@@ -60,6 +65,9 @@ class outer(base1):
         print("calculating op3")
         return 42
 
+for ref in (outer.inner, outer.inner.wrapped.parent, outer.inner.parent.op1): #autocreate, parent_reference, attribute_reference
+    assert not hasattr(ref, "__dict__") #dunder names do not build references
+
 print("creating outer")
 o = outer()
 print("o.op1 = 4")
@@ -72,3 +80,308 @@ print("o.op3")
 o.op3
 print("o.inner.worm")
 o.inner.worm
+
+print("creating a second outer")
+o2 = outer()
+o2.inner.inner_inner
+fired.clear()
+print("o2.op1 = 7")
+o2.op1 = 7
+assert fired == [("inner_on_op1", o2.inner), ("inner_inner_on_op1", o2.inner.inner_inner)]
+fired.clear()
+print("o.op1 = 8")
+o.op1 = 8
+assert fired == [("inner_on_op1", o.inner), ("inner_inner_on_op1", o.inner.inner_inner)]
+print("o2.op2", o2.op2)
+
+class counter:
+    props = property_store()
+    a = props.reactive(1)
+    b = props.reactive(2)
+    alerts = []
+
+    @props.cached(a, b)
+    def total(self):
+        print("calculating total")
+        return self.a + self.b
+
+    @a.add_callback
+    def on_a(self, reason):
+        self.alerts.append(reason)
+        print( ("on_a", tuple(r.args for r in reason)) )
+
+print("batch")
+c = counter()
+c.total
+with property_store.batch():
+    c.a = 10
+    print("c.total in batch", c.total)
+    with property_store.batch():
+        c.a = 20
+        c.b = 5
+    print("nested batch done, no alerts yet")
+    assert counter.alerts == []
+assert len(counter.alerts) == 1 and len(counter.alerts[0]) == 2 #one call, with both alerts of a merged
+print("c.total", c.total)
+assert c.total == 25
+
+class child:
+    parent = autocreate.parent_reference()
+
+class host:
+    child = parent_reference_host()
+
+print("parent_reference_host")
+h, h2, c1, c2 = host(), host(), child(), child()
+h.child = c1
+print("h.child = c1", c1.parent is h)
+assert c1.parent is h
+h.child = c2
+print("h.child = c2", c2.parent is h)
+assert c2.parent is h and "parent" not in vars(c1)
+try:
+    h2.child = c2
+except AttributeError as e:
+    print("h2.child = c2", e)
+h.child = None
+print("h.child = None", h.child)
+assert "parent" not in vars(c2)
+try:
+    c2.parent
+except AttributeError as e:
+    print("c2.parent", e)
+
+class holder:
+    v = 1
+
+    @autocreate
+    class part:
+        parent = autocreate.parent_reference()
+        pv = parent.v
+        pk = getattr(parent, "class") #not an identifier, read and written with getattr/setattr
+
+print("attribute_reference")
+hd = holder()
+setattr(hd, "class", "k")
+assert hd.part.pv == 1 and hd.part.pk == "k"
+hd.part.pv = 2
+hd.part.pk = "k2"
+print("hd.part.pv = 2, hd.part.pk = 'k2'", hd.v, getattr(hd, "class"))
+assert hd.v == 2 and getattr(hd, "class") == "k2" and holder.v == 1
+assert hd.part.pv == 2 and hd.part.pk == "k2"
+
+assert not hasattr(c.props, "__deepcopy__") and "__deepcopy__" not in vars(c.props) #dunder names are not properties
+
+print("strong callbacks")
+strong_fired = []
+def on_a_strong(reason):
+    strong_fired.append(reason[0].args.new_value)
+key = c.props.a.add_callback(on_a_strong) #plain functions are kept as they are, not through a weak reference
+c.a = 30
+print("c.a = 30", strong_fired)
+assert strong_fired == [30]
+c.props.a.del_callback(key)
+c.a = 31
+print("c.a = 31", strong_fired)
+assert strong_fired == [30]
+
+class listener:
+    def __init__(self):
+        self.got = []
+
+    def first(self, reason):
+        self.got.append("first")
+
+    def second(self, reason):
+        self.got.append("second")
+
+print("bound method callbacks")
+l = listener()
+key1 = c.props.b.add_callback(l.first) #default keys of bound methods depend on the instance and the function, not on the temporary method object
+key2 = c.props.b.add_callback(l.second)
+assert key1 != key2
+c.b = 40
+print("c.b = 40", l.got)
+assert sorted(l.got) == ["first", "second"]
+c.props.b.del_callback(key1)
+l.got.clear()
+c.b = 41
+print("c.b = 41", l.got)
+assert l.got == ["second"]
+c.props.b.del_callback(key2)
+l.got.clear()
+c.b = 42
+assert l.got == []
+
+class scaled:
+    props = property_store()
+    a = props.reactive(1)
+
+    @props.cached(a)
+    def total(self):
+        return self.a * 10
+
+    def on_a(self, reason):
+        self.seen.append(("bound", self.total))
+
+print("callback order")
+k = scaled()
+k.seen = []
+k.total
+k.props.a.add_callback(lambda reason: k.seen.append(("plain", k.total))) #registered before the cache reads it
+k.props.a.add_callback(k.on_a)
+k.a = 5
+print("k.a = 5", k.seen)
+assert sorted(k.seen) == [("bound", 50), ("plain", 50)] #the cache is invalidated before any other callback runs
+
+print("cached alerts")
+k2 = scaled()
+invalidations = []
+k2.props.total.add_callback(invalidations.append)
+k2.a = 2
+assert invalidations == [] #never read, nothing to invalidate
+k2.total
+k2.a = 3
+k2.a = 4
+print("read, k2.a = 3, k2.a = 4", len(invalidations))
+assert len(invalidations) == 1 #the second change finds the cache already invalid
+assert k2.total == 40
+
+class caller:
+    def __init__(self):
+        self.log = []
+
+    def pre(self, *args, **kwargs):
+        self.log.append((args, kwargs))
+
+    @call(pre)
+    def plain(self, x):
+        self.log.append("body")
+        return x
+
+    @call(pre, args=(1, 2), kwargs={"k": 3})
+    def fixed(self, x):
+        self.log.append("body")
+        return x
+
+    @call(pre, args=None, kwargs=None)
+    def passed(self, *x, **kw):
+        self.log.append("body")
+        return x
+
+    @call(pre, args=(1, 2), kwargs={"k": 3, "j": 4}, mixargs=True)
+    def mixed(self, *x, **kw):
+        self.log.append("body")
+        return x
+
+    @call(pre, args=(1, ), append=True)
+    def appended(self, x):
+        self.log.append("body")
+        return x
+
+print("call")
+cl = caller()
+r = cl.plain(5)
+print("cl.plain(5)", r, cl.log)
+assert r == 5 and cl.log == [((), {}), "body"]
+cl.log.clear()
+cl.fixed(5)
+print("cl.fixed(5)", cl.log)
+assert cl.log == [((1, 2), {"k": 3}), "body"]
+cl.log.clear()
+r = cl.passed(5, k=6)
+print("cl.passed(5, k=6)", r, cl.log)
+assert r == (5, ) and cl.log == [((5, ), {"k": 6}), "body"]
+cl.log.clear()
+cl.mixed(7, k=8, z=9)
+print("cl.mixed(7, k=8, z=9)", cl.log)
+assert cl.log == [((7, 2), {"k": 8, "j": 4}), "body"]
+cl.log.clear()
+cl.mixed()
+print("cl.mixed()", cl.log)
+assert cl.log == [((1, 2), {"k": 3, "j": 4}), "body"]
+cl.log.clear()
+r = cl.appended(5)
+print("cl.appended(5)", r, cl.log)
+assert r == 5 and cl.log == ["body", ((1, ), {})]
+
+class assigned:
+    @assignargs(a=1, b=2, c=3)
+    def setup(self, a, b, c, **kw):
+        return (a, b, c), kw
+
+print("assignargs")
+ag = assigned()
+r = ag.setup()
+print("ag.setup()", r)
+assert r == ((1, 2, 3), {}) and (ag.a, ag.b, ag.c) == (1, 2, 3)
+ag = assigned()
+r = ag.setup(10, a=20) #positional parameters take precedence
+print("ag.setup(10, a=20)", r)
+assert r == ((10, 2, 3), {}) and (ag.a, ag.b, ag.c) == (10, 2, 3)
+ag = assigned()
+r = ag.setup(10, c=30)
+print("ag.setup(10, c=30)", r)
+assert r == ((10, 2, 30), {}) and (ag.a, ag.b, ag.c) == (10, 2, 30)
+ag = assigned()
+r = ag.setup(z=9) #passed through, not assigned
+print("ag.setup(z=9)", r)
+assert r == ((1, 2, 3), {"z": 9}) and "z" not in vars(ag)
+
+class patched:
+    @monkey_method
+    def who(self):
+        return ("default", self)
+
+print("monkey_method")
+mm = patched()
+assert mm.who() == ("default", mm)
+mm2 = copy.copy(mm) #the copy carries the cached bound method of mm
+assert mm2.who() == ("default", mm2)
+mm.who = lambda self: ("patched", self)
+assert "__mm_who" not in vars(mm)
+print("mm.who()", mm.who())
+assert mm.who() == ("patched", mm)
+del mm.who
+assert "__mm_who" not in vars(mm)
+assert mm.who() == ("default", mm)
+
+class recorder:
+    def __init__(self, *args, **kwargs):
+        self.base = (args, kwargs)
+
+@baseinit
+class derived_plain(recorder):
+    def __init__(self, x):
+        self.x = x
+
+@baseinit(args=None, kwargs=None)
+class derived_passed(recorder):
+    def __init__(self, *x, **kw):
+        self.x = x
+
+@baseinit(args=(1, 2), kwargs={"k": 3}, mixargs=True)
+class derived_mixed(recorder):
+    def __init__(self, *x, **kw):
+        self.x = x
+
+@baseinit(args=(5, ))
+class derived_no_init(recorder):
+    pass
+
+print("baseinit")
+dp = derived_plain(1)
+print("derived_plain(1)", dp.base, dp.x)
+assert dp.base == ((), {}) and dp.x == 1
+dp = derived_passed(1, k=2)
+print("derived_passed(1, k=2)", dp.base, dp.x)
+assert dp.base == ((1, ), {"k": 2}) and dp.x == (1, )
+dm = derived_mixed(7, k=8)
+print("derived_mixed(7, k=8)", dm.base, dm.x)
+assert dm.base == ((7, 2), {"k": 8}) and dm.x == (7, )
+dm = derived_mixed()
+print("derived_mixed()", dm.base, dm.x)
+assert dm.base == ((1, 2), {"k": 3}) and dm.x == ()
+dn = derived_no_init()
+print("derived_no_init()", dn.base)
+assert dn.base == ((5, ), {}) and "x" not in vars(dn)